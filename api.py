@@ -1,18 +1,22 @@
 import os
-import sqlite3
 import json
 import asyncio
 import time
+import threading
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import structlog
+import orjson
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from pydantic import BaseModel, Field, field_validator
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
@@ -23,7 +27,13 @@ from slowapi.errors import RateLimitExceeded
 from tenacity import retry, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
-from src.security_expert.crew import SecurityExpertCrew
+from src.security_expert.cache import PersistentResponseCache, ResponseCache, cache_key
+from src.security_expert.crew import SecurityExpertCrew, config_fingerprint
+from src.security_expert.database import (
+    INSERT_CONVERSATION_SQL, INSERT_SUMMARY_SQL, UPSERT_SESSION_SQL, BatchWriter, ConnectionPool,
+    attach_conversations, attach_summaries, compress_text, conversation_hash, fetch_dicts,
+    init_schema, init_summaries_schema, new_summary_id, now_ms, summary_preview
+)
 
 # Load environment variables
 load_dotenv()
@@ -31,6 +41,7 @@ load_dotenv()
 # Configure structured logging
 structlog.configure(
     processors=[
+        structlog.contextvars.merge_contextvars,
         structlog.stdlib.filter_by_level,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
@@ -54,95 +65,209 @@ REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method',
 REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration')
 CREW_EXECUTION_COUNT = Counter('crew_executions_total', 'Total crew executions', ['action', 'status'])
 CREW_EXECUTION_DURATION = Histogram('crew_execution_duration_seconds', 'Crew execution duration')
+CREW_CACHE_COUNT = Counter('crew_cache_lookups_total', 'Crew response cache lookups', ['action', 'result'])
 
 # Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+def client_ip(request: Request) -> str:
+    """Client address resolved once by the request middleware, shared by logs and rate limits"""
+    return getattr(request.state, "client_ip", None) or get_remote_address(request)
+
+# In-memory limits are per worker process; point this at redis (redis://host:6379) to share them
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+limiter = Limiter(key_func=client_ip, storage_uri=RATE_LIMIT_STORAGE_URI)
+
+# HTTP
+ALLOWED_HOSTS = [h.strip() for h in os.getenv("ALLOWED_HOSTS", "*").split(",") if h.strip()]
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",") if o.strip()]
+
+HEALTH_CACHE_TTL = float(os.getenv("HEALTH_CACHE_TTL", "1.5"))
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "1"))
+
+# Crew execution
+CREW_MAX_WORKERS = int(os.getenv("CREW_MAX_WORKERS", "16"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+KICKOFF_CACHE_TTL = float(os.getenv("KICKOFF_CACHE_TTL", "86400"))
+response_cache = ResponseCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
 
 # Database and logging setup
 DB_FILE = os.getenv("DATABASE_FILE", "security_analysis.db")
+SUMMARIES_DB_FILE = os.getenv("SUMMARIES_DATABASE_FILE", "summaries.db")
 LOG_FILE = "application.log"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+DB_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DB_WRITE_BATCH_SIZE = int(os.getenv("DATABASE_WRITE_BATCH_SIZE", "256"))
+DB_WRITE_BATCH_DELAY = float(os.getenv("DATABASE_WRITE_BATCH_DELAY", "0.05"))
+
+INSERT_ANALYSIS_SQL = '''
+    INSERT INTO analysis_history 
+    (session_id, tech_stack, interview_hash, analysis_summary, analysis_type, status, timestamp, summary_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Keyset on (timestamp, id) so rows sharing a millisecond are not skipped at a page boundary
+SELECT_HISTORY_SQL = '''
+    SELECT id, tech_stack, interview_results, analysis_summary, analysis_type, 
+           status, timestamp, created_at, summary_id, interview_hash 
+    FROM analysis_history 
+    WHERE session_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC 
+    LIMIT ?
+'''
+# Cursor for the first page: sorts after every real (timestamp, id)
+HISTORY_START = 2 ** 63 - 1
+
+SELECT_RECENT_SESSIONS_SQL = '''
+    SELECT session_id, last_activity, analysis_count
+    FROM sessions 
+    WHERE last_activity > ?
+    ORDER BY last_activity DESC 
+    LIMIT ?
+'''
 
 class DatabaseManager:
     """Thread-safe database operations with connection pooling"""
     
-    def __init__(self, db_file: str = DB_FILE):
+    def __init__(self, db_file: str = DB_FILE, summaries_file: str = SUMMARIES_DB_FILE,
+                 pool_size: int = DB_POOL_SIZE):
         self.db_file = db_file
+        self.summaries_file = summaries_file
+        self.pool = ConnectionPool(db_file, size=pool_size)
+        # Separate file, pool and writer: summary writes never take the history DB's write lock
+        self.summaries_pool = ConnectionPool(summaries_file, size=pool_size)
         self._init_db()
+        self.writer = BatchWriter(
+            self.pool, INSERT_ANALYSIS_SQL,
+            max_batch=DB_WRITE_BATCH_SIZE, max_delay=DB_WRITE_BATCH_DELAY
+        )
+        self.summary_writer = BatchWriter(
+            self.summaries_pool, INSERT_SUMMARY_SQL,
+            max_batch=DB_WRITE_BATCH_SIZE, max_delay=DB_WRITE_BATCH_DELAY
+        )
+        # One thread per pooled connection: DB calls never queue behind other
+        # default-executor work, and never wait on the pool for a free connection
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite")
+
+    async def run(self, func, *args):
+        """Await a blocking database call on the database thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
     
     def _init_db(self):
         """Initialize database with proper schema"""
         try:
-            with sqlite3.connect(self.db_file, timeout=30) as conn:
-                conn.execute('PRAGMA journal_mode=WAL')  # Better concurrent access
-                conn.execute('PRAGMA synchronous=NORMAL')  # Better performance
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS analysis_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT NOT NULL,
-                        tech_stack TEXT NOT NULL,
-                        interview_results TEXT,
-                        analysis_summary TEXT NOT NULL,
-                        analysis_type TEXT DEFAULT 'comprehensive',
-                        status TEXT DEFAULT 'completed',
-                        timestamp DATETIME NOT NULL,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                conn.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_session_id ON analysis_history(session_id)
-                ''')
-                conn.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_timestamp ON analysis_history(timestamp)
-                ''')
-                conn.commit()
+            with self.pool.connection(write=True) as conn:
+                init_schema(conn)
+            with self.summaries_pool.connection(write=True) as conn:
+                init_summaries_schema(conn)
                 logger.info("Database initialized successfully")
         except Exception as e:
             logger.error("Database initialization failed", error=str(e))
             raise
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def add_analysis(self, session_id: str, tech_stack: str, interview_results: str, 
                     summary: str, analysis_type: str = 'comprehensive', status: str = 'completed'):
-        """Add analysis to database with retry logic"""
-        try:
-            with sqlite3.connect(self.db_file, timeout=30) as conn:
-                conn.execute('''
-                    INSERT INTO analysis_history 
-                    (session_id, tech_stack, interview_results, analysis_summary, analysis_type, status, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (session_id, tech_stack, interview_results, summary, analysis_type, status, datetime.now()))
-                conn.commit()
-                logger.info("Analysis saved to database", session_id=session_id)
-        except Exception as e:
-            logger.error("Failed to save analysis", session_id=session_id, error=str(e))
-            raise
-
-    def get_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get analysis history for a session"""
+        """Queue analysis for the batched writers, which retry failed commits
+
+        The history row is only queued once the summary has committed, so readers
+        never see a history row whose full text is still in flight.
+        """
+        summary_id = new_summary_id()
+        interview_hash = conversation_hash(interview_results)
+        timestamp = now_ms()
+
+        def write_history():
+            self.writer.put(
+                (session_id, tech_stack, interview_hash, summary_preview(summary), analysis_type, status, timestamp, summary_id)
+            )
+            # Same writer, so the upsert commits in the same transaction as the history row
+            self.writer.put((session_id, timestamp), sql=UPSERT_SESSION_SQL)
+
+        # The conversation is queued first, so it commits no later than the summary
+        self.summary_writer.put((interview_hash, compress_text(interview_results)), sql=INSERT_CONVERSATION_SQL)
+        self.summary_writer.put((summary_id, session_id, compress_text(summary)), on_commit=write_history)
+        logger.info("Analysis queued for database", session_id=session_id)
+
+    def get_history(self, session_id: str, limit: int = 20, before: Optional[int] = None,
+                    before_id: Optional[int] = None, include_conversation: bool = True) -> List[Dict[str, Any]]:
+        """Get a page of analysis history older than (`before`, `before_id`), optionally without the interview transcripts
+
+        Without `before_id`, every row at the `before` timestamp is treated as already seen.
+        """
+        if before is None:
+            before, before_id = HISTORY_START, HISTORY_START
+        elif before_id is None:
+            before_id = 0
         try:
-            with sqlite3.connect(self.db_file, timeout=30) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT tech_stack, interview_results, analysis_summary, analysis_type, 
-                           status, timestamp, created_at 
-                    FROM analysis_history 
-                    WHERE session_id = ? 
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                ''', (session_id, limit))
-                rows = cursor.fetchall()
-                return [dict(row) for row in rows]
+            with self.pool.connection() as conn:
+                rows = fetch_dicts(conn.execute(SELECT_HISTORY_SQL, (session_id, before, before_id, limit)))
+            with self.summaries_pool.connection() as conn:
+                attach_summaries(conn, rows)
+                if include_conversation:
+                    return attach_conversations(conn, rows)
+            for row in rows:
+                row.pop('interview_hash', None)
+            return rows
         except Exception as e:
             logger.error("Failed to fetch history", session_id=session_id, error=str(e))
             return []
 
+    def get_recent_sessions(self, days: int = 7, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get sessions with activity in the last `days` days"""
+        with self.pool.connection() as conn:
+            return fetch_dicts(conn.execute(SELECT_RECENT_SESSIONS_SQL, (now_ms() - days * 86_400_000, limit)))
+
+    def ping(self) -> bool:
+        """Check that the database answers a trivial query"""
+        try:
+            for pool in (self.pool, self.summaries_pool):
+                with pool.connection() as conn:
+                    conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """Flush queued writes and close pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.summary_writer.close()
+        self.writer.close()
+        self.summaries_pool.close()
+        self.pool.close()
+
+def start_logging() -> Tuple[QueueHandler, QueueListener]:
+    """Route root logging through a queue to the console and LOG_FILE
+
+    Handlers run on the listener's thread, so logging from a request only enqueues
+    the record. Called from lifespan, so importing this module configures nothing.
+    """
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(
+        log_queue,
+        logging.StreamHandler(),
+        logging.FileHandler(LOG_FILE, encoding='utf-8'),
+    )
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    listener.start()
+    return queue_handler, listener
+
+def stop_logging(queue_handler: QueueHandler, listener: QueueListener):
+    """Detach the queue handler, drain the queue and close the file"""
+    logging.getLogger().removeHandler(queue_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
 db_manager = DatabaseManager()
+kickoff_cache = PersistentResponseCache(db_manager.summaries_pool, ttl=KICKOFF_CACHE_TTL)
 
 # Pydantic models with enhanced validation (V2 syntax)
 class TechStackRequest(BaseModel):
     tech_stack: str = Field(..., min_length=1, max_length=2000, description="Technology stack description")
+    use_cache: bool = Field(default=True, description="Allow a cached response; disable for sensitive prompts")
     
     @field_validator('tech_stack')
     @classmethod
@@ -154,6 +279,7 @@ class TechStackRequest(BaseModel):
 class InterviewRequest(BaseModel):
     user_response: str = Field(..., min_length=1, max_length=5000, description="User response to interview question")
     conversation_history: str = Field(default="", max_length=50000, description="Conversation history")
+    use_cache: bool = Field(default=True, description="Allow a cached response; disable for sensitive prompts")
     
     @field_validator('user_response')
     @classmethod
@@ -166,6 +292,7 @@ class AnalysisRequest(BaseModel):
     conversation_history: str = Field(..., min_length=1, max_length=50000, description="Complete conversation history")
     session_id: str = Field(..., min_length=1, max_length=100, description="Session identifier")
     tech_stack: str = Field(..., min_length=1, max_length=2000, description="Technology stack")
+    use_cache: bool = Field(default=True, description="Allow a cached response; disable for sensitive prompts")
     
     @field_validator('session_id')
     @classmethod
@@ -178,18 +305,30 @@ class HistoryResponse(BaseModel):
     status: str
     history: List[Dict[str, Any]]
     total_count: int
+    next_before: Optional[int] = None
+    next_before_id: Optional[int] = None
+
+_now_iso = (0, "")
+
+def now_iso() -> str:
+    """Current time as ISO text at one-second resolution, formatted at most once per second"""
+    global _now_iso
+    second = int(time.time())
+    if second != _now_iso[0]:
+        _now_iso = (second, datetime.fromtimestamp(second).isoformat())
+    return _now_iso[1]
 
 class APIResponse(BaseModel):
     status: str
     message: Optional[str] = None
     data: Optional[Dict[str, Any]] = None
-    timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: str = Field(default_factory=now_iso)
 
 class ErrorResponse(BaseModel):
     status: str = "error"
     error: str
     error_code: Optional[str] = None
-    timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: str = Field(default_factory=now_iso)
 
 class CrewManager:
     """Manages crew instances with proper error handling and retries"""
@@ -198,6 +337,12 @@ class CrewManager:
         self._crew_instance: Optional[SecurityExpertCrew] = None
         self._last_health_check = 0
         self._health_check_interval = 300  # 5 minutes
+        self._lock = threading.Lock()
+        # Dedicated pool so multi-second LLM calls cannot exhaust the default
+        # executor that the database and health checks also run on
+        self.executor = ThreadPoolExecutor(max_workers=CREW_MAX_WORKERS, thread_name_prefix="crew")
+        # Streamed kickoffs whose client went away, kept referenced until they finish
+        self._detached: set = set()
     
     def _health_check(self) -> bool:
         """Check if crew instance is healthy"""
@@ -219,18 +364,108 @@ class CrewManager:
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_crew_instance(self) -> SecurityExpertCrew:
         """Get or create crew instance with health checking"""
-        if not self._health_check():
-            logger.info("Creating new crew instance")
+        if self._health_check():
+            return self._crew_instance
+        # Double-checked so concurrent first requests build a single shared instance
+        with self._lock:
+            if not self._health_check():
+                logger.info("Creating new crew instance")
+                try:
+                    self._crew_instance = SecurityExpertCrew()
+                    logger.info("Crew instance created successfully")
+                except Exception as e:
+                    logger.error("Failed to create crew instance", error=str(e))
+                    raise HTTPException(
+                        status_code=503, 
+                        detail="Service temporarily unavailable - crew initialization failed"
+                    )
+            return self._crew_instance
+
+    async def kickoff(self, crew: SecurityExpertCrew, inputs: Dict[str, Any], use_cache: bool = True,
+                      step_callback=None, namespace: str = "") -> str:
+        """Run a blocking crew kickoff on the crew thread pool, serving repeats from the cache
+
+        Cached responses are only shared between calls with the same `namespace`.
+        """
+        action = inputs.get('action', 'unknown')
+        if use_cache:
+            key = cache_key(inputs, config_fingerprint(), namespace)
+            cached = response_cache.get(key)
+            if cached is None:
+                # Same key in the SQLite cache shared across worker processes
+                cached = await db_manager.run(kickoff_cache.get, key)
+                if cached is not None:
+                    response_cache.set(key, cached)
+            if cached is not None:
+                CREW_CACHE_COUNT.labels(action=action, result='hit').inc()
+                return cached
+            CREW_CACHE_COUNT.labels(action=action, result='miss').inc()
+        result = await asyncio.get_running_loop().run_in_executor(
+            self.executor, crew.kickoff, inputs, step_callback
+        )
+        result = str(result)
+        if use_cache:
+            response_cache.set(key, result)
             try:
-                self._crew_instance = SecurityExpertCrew()
-                logger.info("Crew instance created successfully")
+                await db_manager.run(kickoff_cache.set, key, result)
             except Exception as e:
-                logger.error("Failed to create crew instance", error=str(e))
-                raise HTTPException(
-                    status_code=503, 
-                    detail="Service temporarily unavailable - crew initialization failed"
-                )
-        return self._crew_instance
+                logger.warning("Failed to persist cached response", action=action, error=str(e))
+        return result
+
+    async def kickoff_stream(self, crew: SecurityExpertCrew, inputs: Dict[str, Any],
+                             use_cache: bool = True, namespace: str = "",
+                             on_result=None) -> AsyncIterator[Dict[str, str]]:
+        """Yield a `step` event per intermediate agent step, then one `result` event
+
+        If the consumer stops early (e.g. the client disconnects), the kickoff is not
+        cancelled: the LLM call keeps running on its thread either way, so it is left
+        to finish and its result is still cached and passed to `on_result`.
+        """
+        loop = asyncio.get_running_loop()
+        steps: asyncio.Queue = asyncio.Queue()
+
+        def on_step(step):
+            # Called on a crew worker thread
+            loop.call_soon_threadsafe(steps.put_nowait, step)
+
+        def finished(task: asyncio.Task):
+            # Runs on the event loop once the kickoff completes, whether or not anyone is still streaming
+            detached = task in self._detached
+            self._detached.discard(task)
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                # A streaming consumer already got the error from run.result()
+                if detached:
+                    logger.warning("Detached kickoff failed", error=str(task.exception()))
+                return
+            if on_result is not None:
+                try:
+                    on_result(task.result())
+                except Exception as e:
+                    logger.error("Failed to handle kickoff result", error=str(e))
+
+        run = asyncio.ensure_future(self.kickoff(
+            crew, inputs, use_cache=use_cache, step_callback=on_step, namespace=namespace
+        ))
+        run.add_done_callback(finished)
+        try:
+            while not run.done() or not steps.empty():
+                next_step = asyncio.ensure_future(steps.get())
+                await asyncio.wait({next_step, run}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_step.done():
+                    next_step.cancel()
+                    continue
+                step = next_step.result()
+                yield {"type": "step", "content": str(getattr(step, 'thought', None) or getattr(step, 'output', step))}
+            yield {"type": "result", "content": run.result()}
+        finally:
+            if not run.done():
+                self._detached.add(run)
+
+    def shutdown(self):
+        """Stop accepting crew work and drop queued kickoffs"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 crew_manager = CrewManager()
 
@@ -238,15 +473,17 @@ crew_manager = CrewManager()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application startup and shutdown"""
+    log_handler, log_listener = start_logging()
     logger.info("🚀 AI Security Expert API starting up...")
     
     # Startup
     try:
         # Initialize database
         db_manager._init_db()
+        await db_manager.run(kickoff_cache.purge_expired)
         
         # Pre-warm crew instance
-        await asyncio.get_event_loop().run_in_executor(None, crew_manager.get_crew_instance)
+        await asyncio.to_thread(crew_manager.get_crew_instance)
         
         # Validate required environment variables
         required_env_vars = ["GEMINI_API_KEY"]
@@ -258,12 +495,16 @@ async def lifespan(app: FastAPI):
         
     except Exception as e:
         logger.error("Application startup failed", error=str(e))
+        stop_logging(log_handler, log_listener)
         raise
     
     yield
     
     # Shutdown
     logger.info("Application shutting down...")
+    crew_manager.shutdown()
+    db_manager.close()
+    stop_logging(log_handler, log_listener)
 
 # FastAPI application setup
 app = FastAPI(
@@ -271,44 +512,52 @@ app = FastAPI(
     description="Production-grade Interactive Security Analysis through Comprehensive Requirements Gathering",
     version="2.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json"
 )
 
-# Security middleware
-app.add_middleware(
-    TrustedHostMiddleware, 
-    #allowed_hosts=os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
-    allowed_hosts=["*"]
-)
-
-# CORS middleware - configure for production
-app.add_middleware(
-    CORSMiddleware,
-    #allow_origins=os.getenv("ALLOWED_ORIGINS", "").split(","), # Default to empty list for security
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["*"],
-    max_age=3600,
-)
+# Security middleware - a wildcard host list would accept every request, so skip the extra pass
+if ALLOWED_HOSTS != ["*"]:
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=ALLOWED_HOSTS)
+
+# CORS middleware - configure for production; leave ALLOWED_ORIGINS empty for server-to-server use.
+# Credentials are never honoured by browsers alongside a wildcard origin, so they stay off.
+if ALLOWED_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_credentials=False,
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type"],
+        max_age=3600,
+    )
 
 # Rate limiting middleware
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Request logging middleware
+# Polled by scrapers and probes; counted in metrics but kept out of the logs
+UNLOGGED_PATHS = frozenset({"/", "/health", "/metrics"})
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
+    path = request.url.path
+    logged = path not in UNLOGGED_PATHS
+    request.state.client_ip = get_remote_address(request)
     
-    logger.info(
-        "Request started",
-        method=request.method,
-        url=str(request.url),
-        client_ip=get_remote_address(request)
-    )
+    if logged:
+        # Every log line emitted while handling this request carries these fields
+        structlog.contextvars.clear_contextvars()
+        structlog.contextvars.bind_contextvars(
+            method=request.method,
+            url=str(request.url),
+            client_ip=request.state.client_ip
+        )
+        logger.info("Request started")
     
     response = await call_next(request)
     
@@ -316,18 +565,13 @@ async def log_requests(request: Request, call_next):
     
     REQUEST_COUNT.labels(
         method=request.method,
-        endpoint=request.url.path,
+        endpoint=path,
         status=response.status_code
     ).inc()
     REQUEST_DURATION.observe(duration)
     
-    logger.info(
-        "Request completed",
-        method=request.method,
-        url=str(request.url),
-        status_code=response.status_code,
-        duration=duration
-    )
+    if logged:
+        logger.info("Request completed", status_code=response.status_code, duration=duration)
     
     return response
 
@@ -340,7 +584,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         detail=exc.detail,
         url=str(request.url)
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
@@ -357,7 +601,7 @@ async def general_exception_handler(request: Request, exc: Exception):
         url=str(request.url),
         exc_info=True
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=ErrorResponse(
             error="Internal server error",
@@ -368,15 +612,11 @@ async def general_exception_handler(request: Request, exc: Exception):
 # Dependency injection
 async def get_crew_instance() -> SecurityExpertCrew:
     """Dependency to get crew instance"""
-    return await asyncio.get_event_loop().run_in_executor(
-        None, crew_manager.get_crew_instance
-    )
+    return await asyncio.to_thread(crew_manager.get_crew_instance)
 
 # API Routes
-@app.get("/", response_class=HTMLResponse, summary="API Landing Page")
-async def root() -> HTMLResponse:
-    """Landing page with API information"""
-    return HTMLResponse("""
+# Encoded once at import; each request only wraps the bytes
+ROOT_HTML = """
     <!DOCTYPE html>
     <html>
         <head>
@@ -406,19 +646,25 @@ async def root() -> HTMLResponse:
             <p><strong>Version:</strong> 2.0.0</p>
         </body>
     </html>
-    """)
+    """.encode("utf-8")
+
+@app.get("/", response_class=HTMLResponse, summary="API Landing Page")
+async def root() -> HTMLResponse:
+    """Landing page with API information"""
+    return HTMLResponse(ROOT_HTML)
+
+# (computed_at, body, status_code) of the last health check; probes within the TTL reuse it
+_health_cache: tuple = (0.0, None, 200)
 
 @app.get("/health", summary="Comprehensive Health Check")
 async def health_check() -> Dict[str, Any]:
     """Comprehensive health check endpoint"""
+    global _health_cache
+    computed_at, cached_status, cached_code = _health_cache
+    if cached_status is not None and time.monotonic() - computed_at < HEALTH_CACHE_TTL:
+        return ORJSONResponse(content=cached_status, status_code=cached_code)
     try:
-        db_healthy = False
-        try:
-            with sqlite3.connect(DB_FILE, timeout=5) as conn:
-                conn.execute("SELECT 1").fetchone()
-            db_healthy = True
-        except Exception:
-            db_healthy = False
+        db_healthy = await db_manager.run(db_manager.ping)
         
         crew_healthy = crew_manager._health_check()
         
@@ -438,11 +684,12 @@ async def health_check() -> Dict[str, Any]:
         }
         
         status_code = 200 if health_status["status"] == "healthy" else 503
-        return JSONResponse(content=health_status, status_code=status_code)
+        _health_cache = (time.monotonic(), health_status, status_code)
+        return ORJSONResponse(content=health_status, status_code=status_code)
         
     except Exception as e:
         logger.error("Health check failed", error=str(e))
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={
                 "status": "unhealthy",
@@ -451,10 +698,18 @@ async def health_check() -> Dict[str, Any]:
             }
         )
 
+# (generated_at, payload) of the last scrape; scrapers never poll faster than once a second
+_metrics_cache: tuple = (0.0, b"")
+
 @app.get("/metrics", summary="Prometheus Metrics")
 async def metrics():
     """Expose Prometheus metrics"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    global _metrics_cache
+    generated_at, payload = _metrics_cache
+    if time.monotonic() - generated_at >= METRICS_CACHE_TTL:
+        payload = generate_latest()
+        _metrics_cache = (time.monotonic(), payload)
+    return Response(payload, media_type=CONTENT_TYPE_LATEST)
 
 @app.post("/interview/start", 
           summary="Start Security Interview", 
@@ -476,9 +731,7 @@ async def start_interview(
             'conversation_history': ''
         }
         
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, crew.kickoff, inputs
-        )
+        result = await crew_manager.kickoff(crew, inputs, use_cache=tech_request.use_cache)
         
         duration = time.time() - start_time
         CREW_EXECUTION_COUNT.labels(action='start_interview', status='success').inc()
@@ -488,7 +741,7 @@ async def start_interview(
         
         return APIResponse(
             status="success",
-            message=str(result),
+            message=result,
             data={"type": "interview_question"}
         )
         
@@ -520,9 +773,7 @@ async def continue_interview(
             'action': 'continue_interview'
         }
         
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, crew.kickoff, inputs
-        )
+        result = await crew_manager.kickoff(crew, inputs, use_cache=interview_request.use_cache)
         
         duration = time.time() - start_time
         CREW_EXECUTION_COUNT.labels(action='continue_interview', status='success').inc()
@@ -532,7 +783,7 @@ async def continue_interview(
         
         return APIResponse(
             status="success",
-            message=str(result),
+            message=result,
             data={"type": "interview_question"}
         )
         
@@ -564,8 +815,8 @@ async def perform_analysis(
             'action': 'perform_analysis'
         }
         
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, crew.kickoff, inputs
+        result = await crew_manager.kickoff(
+            crew, inputs, use_cache=analysis_request.use_cache, namespace=analysis_request.session_id
         )
         
         background_tasks.add_task(
@@ -573,7 +824,7 @@ async def perform_analysis(
             analysis_request.session_id,
             analysis_request.tech_stack,
             analysis_request.conversation_history,
-            str(result)
+            result
         )
         
         duration = time.time() - start_time
@@ -584,11 +835,11 @@ async def perform_analysis(
         
         return APIResponse(
             status="success",
-            message=str(result),
+            message=result,
             data={
                 "type": "final_analysis", 
                 "session_id": analysis_request.session_id,
-                "analysis_length": len(str(result))
+                "analysis_length": len(result)
             }
         )
         
@@ -600,6 +851,44 @@ async def perform_analysis(
         logger.error("Analysis failed", session_id=analysis_request.session_id, error=str(e), duration=duration, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to perform analysis")
 
+@app.post("/analysis/perform/stream", summary="Perform Security Analysis (streamed)")
+@limiter.limit("5/minute")
+async def perform_analysis_stream(
+    request: Request,
+    analysis_request: AnalysisRequest,
+    crew: SecurityExpertCrew = Depends(get_crew_instance)
+):
+    """Perform security analysis, streaming agent progress as NDJSON events before the final result"""
+    inputs = {
+        'conversation_history': analysis_request.conversation_history,
+        'action': 'perform_analysis'
+    }
+
+    async def events():
+        start_time = time.time()
+        try:
+            # Persisted from the kickoff's completion, so a result is still stored if the
+            # client disconnects first; add_analysis only queues rows for the batch writers
+            async for event in crew_manager.kickoff_stream(
+                crew, inputs, use_cache=analysis_request.use_cache, namespace=analysis_request.session_id,
+                on_result=lambda result: db_manager.add_analysis(
+                    analysis_request.session_id,
+                    analysis_request.tech_stack,
+                    analysis_request.conversation_history,
+                    result
+                )
+            ):
+                yield orjson.dumps(event) + b"\n"
+            CREW_EXECUTION_COUNT.labels(action='perform_analysis', status='success').inc()
+        except Exception as e:
+            CREW_EXECUTION_COUNT.labels(action='perform_analysis', status='error').inc()
+            logger.error("Streamed analysis failed", session_id=analysis_request.session_id, error=str(e), exc_info=True)
+            yield orjson.dumps({"type": "error", "content": "Failed to perform analysis"}) + b"\n"
+        finally:
+            CREW_EXECUTION_DURATION.observe(time.time() - start_time)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.get("/history/{session_id}", 
          response_model=HistoryResponse, 
          summary="Get Analysis History")
@@ -607,26 +896,37 @@ async def perform_analysis(
 async def get_history(
     request: Request,
     session_id: str,
-    limit: int = 50
+    limit: int = 20,
+    before: Optional[int] = None,
+    before_id: Optional[int] = None,
+    include_conversation: bool = True
 ) -> HistoryResponse:
-    """Get analysis history for a session"""
+    """Get analysis history for a session, newest first
+
+    Pass `next_before` and `next_before_id` back as `before` and `before_id` for the next page.
+    """
     try:
         if not session_id.strip():
             raise HTTPException(status_code=400, detail="Session ID cannot be empty")
         
-        limit = min(limit, 100) # Cap limit at 100
+        limit = max(1, min(limit, 100)) # Clamp limit to 1..100
             
-        logger.info("Fetching history", session_id=session_id, limit=limit)
-        
-        history = await asyncio.get_event_loop().run_in_executor(
-            None, db_manager.get_history, session_id, limit
-        )
+        logger.info("Fetching history", session_id=session_id, limit=limit, before=before)
         
-        return HistoryResponse(
-            status="success",
-            history=history,
-            total_count=len(history)
+        history = await db_manager.run(
+            db_manager.get_history, session_id, limit, before, before_id, include_conversation
         )
+        last = history[-1] if len(history) == limit else None
+        
+        # Rows are already plain dicts: hand them straight to orjson rather than
+        # having FastAPI validate and re-encode every summary through the model
+        return ORJSONResponse({
+            "status": "success",
+            "history": history,
+            "total_count": len(history),
+            "next_before": last['timestamp'] if last else None,
+            "next_before_id": last['id'] if last else None
+        })
         
     except HTTPException:
         raise
@@ -639,23 +939,14 @@ async def get_history(
 async def get_sessions(request: Request):
     """Get list of recent sessions from the last 7 days"""
     try:
-        with sqlite3.connect(DB_FILE, timeout=30) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT DISTINCT session_id, MAX(timestamp) as last_activity, COUNT(*) as analysis_count
-                FROM analysis_history 
-                WHERE timestamp > datetime('now', '-7 days')
-                GROUP BY session_id 
-                ORDER BY last_activity DESC 
-                LIMIT 100
-            ''')
-            sessions = [dict(row) for row in cursor.fetchall()]
+        sessions = await db_manager.run(db_manager.get_recent_sessions)
             
-        return APIResponse(
-            status="success",
-            data={"sessions": sessions, "count": len(sessions)}
-        )
+        return ORJSONResponse({
+            "status": "success",
+            "message": None,
+            "data": {"sessions": sessions, "count": len(sessions)},
+            "timestamp": now_iso()
+        })
         
     except Exception as e:
         logger.error("Failed to fetch sessions", error=str(e))
@@ -1,66 +1,151 @@
+import atexit
 import streamlit as st
-from src.security_expert.crew import SecurityExpertCrew
+from src.security_expert.cache import PersistentResponseCache, cache_key
+from src.security_expert.database import (
+    INSERT_CONVERSATION_SQL, INSERT_SUMMARY_SQL, SUMMARY_PREVIEW_CHARS, UPSERT_SESSION_SQL, BatchWriter,
+    ConnectionPool, compress_text, conversation_hash, fetch_dicts, init_schema, init_summaries_schema,
+    new_summary_id, now_ms, summary_preview
+)
 from dotenv import load_dotenv
 import os
 from datetime import datetime
+import orjson
+from functools import lru_cache
+import queue
 import re
-import sqlite3
-import json
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 
 load_dotenv()
 
 # -------------------- DB and Logging Setup --------------------
 DB_FILE = "security_analysis.db"
-LOG_FILE = "logs.json"
+SUMMARIES_DB_FILE = "summaries.db"
+LOG_FILE = "logs.jsonl"
+
+INSERT_HISTORY_SQL = '''
+    INSERT INTO analysis_history (session_id, tech_stack, interview_hash, analysis_summary, analysis_type, timestamp, summary_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+# The sidebar only needs the preview, never the full analysis text
+SELECT_HISTORY_SQL = f"SELECT summary_id, tech_stack, substr(analysis_summary, 1, {SUMMARY_PREVIEW_CHARS}) AS analysis_summary, analysis_type, timestamp FROM analysis_history WHERE session_id = ? ORDER BY timestamp DESC LIMIT ?"
+HISTORY_LIMIT = 20
+CREW_MAX_WORKERS = 4
+QUICK_STARTS = (
+    ("🌐 Web Application", "React frontend with Node.js Express backend, MongoDB database"),
+    ("📱 Mobile Application", "Flutter mobile app with Firebase backend"),
+    ("☁️ Cloud Native Stack", "Microservices with Docker and Kubernetes"),
+    ("🤖 AI/ML Application", "Python ML application with TensorFlow and PostgreSQL"),
+    ("🏢 Enterprise System", "Java Spring Boot application with Oracle database"),
+)
+# Interview turns sent to the crew verbatim; older ones are cut to an excerpt
+CONVERSATION_MAX_TURNS = 20
+TURN_EXCERPT_CHARS = 200
+DB_POOL_SIZE = 4
+# Same table and TTL as the API's kickoff cache, so either front end can serve the other's results
+KICKOFF_CACHE_TTL = 86400
 
+@st.cache_resource
+def get_db_pools():
+    # Long-lived connections shared by every session's script thread, so reruns
+    # reuse a warm page cache instead of reopening the database files
+    return ConnectionPool(DB_FILE, size=DB_POOL_SIZE), ConnectionPool(SUMMARIES_DB_FILE, size=DB_POOL_SIZE)
+
+@st.cache_resource
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS analysis_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            tech_stack TEXT NOT NULL,
-            interview_results TEXT,
-            analysis_summary TEXT NOT NULL,
-            analysis_type TEXT DEFAULT 'comprehensive',
-            timestamp DATETIME NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    # Cached so the schema check runs once per server process, not on every rerun
+    history_pool, summaries_pool = get_db_pools()
+    with history_pool.connection(write=True) as conn:
+        init_schema(conn)
+    with summaries_pool.connection(write=True) as conn:
+        init_summaries_schema(conn)
+
+@st.cache_resource
+def get_db_writers():
+    # Background writer threads, so the commit happens off the script thread
+    history_pool, summaries_pool = get_db_pools()
+    history_writer = BatchWriter(history_pool, INSERT_HISTORY_SQL)
+    summary_writer = BatchWriter(summaries_pool, INSERT_SUMMARY_SQL)
+
+    def close_writers():
+        # The writers are daemon threads: write out queued rows before the server exits.
+        # Summaries first, since their commit callbacks queue the history rows.
+        summary_writer.close()
+        history_writer.close()
+
+    atexit.register(close_writers)
+    return history_writer, summary_writer
+
+@st.cache_resource
+def get_kickoff_cache():
+    _, summaries_pool = get_db_pools()
+    cache = PersistentResponseCache(summaries_pool, ttl=KICKOFF_CACHE_TTL)
+    # Once per server process: nothing else purges the cache on the Streamlit side
+    cache.purge_expired()
+    return cache
 
 def add_analysis_to_db(session_id, tech_stack, interview_results, summary, analysis_type='comprehensive'):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO analysis_history (session_id, tech_stack, interview_results, analysis_summary, analysis_type, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (session_id, tech_stack, interview_results, summary, analysis_type, datetime.now()))
-    conn.commit()
-    conn.close()
-
-def get_history_from_db(session_id):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT tech_stack, interview_results, analysis_summary, analysis_type, timestamp FROM analysis_history WHERE session_id = ? ORDER BY timestamp DESC", (session_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    summary_id = new_summary_id()
+    interview_hash = conversation_hash(interview_results)
+    timestamp = now_ms()
+    history_writer, summary_writer = get_db_writers()
+
+    def write_history():
+        history_writer.put((session_id, tech_stack, interview_hash, summary_preview(summary), analysis_type, timestamp, summary_id))
+        history_writer.put((session_id, timestamp), sql=UPSERT_SESSION_SQL)
+
+    # The history row is queued only once its summary (and the earlier-queued conversation) has committed
+    summary_writer.put((interview_hash, compress_text(interview_results)), sql=INSERT_CONVERSATION_SQL)
+    summary_writer.put((summary_id, session_id, compress_text(summary)), on_commit=write_history)
+    # The sidebar row, so callers can show it before the writer has committed it
+    return {
+        "summary_id": summary_id,
+        "tech_stack": tech_stack,
+        "analysis_summary": summary_preview(summary),
+        "analysis_type": analysis_type,
+        "timestamp": timestamp,
+    }
+
+def get_history_from_db(session_id, limit=HISTORY_LIMIT):
+    # No flush: rows still queued on the writer are merged in from session state
+    history_pool, _ = get_db_pools()
+    with history_pool.connection() as conn:
+        return fetch_dicts(conn.execute(SELECT_HISTORY_SQL, (session_id, limit)))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_cached_history(session_id, version):
+    # `version` only keys the cache; callers bump it whenever they add an analysis
+    return get_history_from_db(session_id)
+
+def merge_history(recent, stored):
+    # This session's own analyses go first unless the database read already has them
+    seen = {row["summary_id"] for row in stored}
+    return ([row for row in recent if row["summary_id"] not in seen] + stored)[:HISTORY_LIMIT]
+
+def _drain_error_log(log_queue):
+    # Single consumer: block for one record, then grab whatever else is pending
+    # so a burst of errors becomes one write + flush
+    with open(LOG_FILE, 'ab') as f:
+        while True:
+            lines = [log_queue.get()]
+            while True:
+                try:
+                    lines.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            f.write(b"".join(lines))
+            f.flush()
+
+@st.cache_resource
+def get_error_log():
+    log_queue = queue.SimpleQueue()
+    threading.Thread(target=_drain_error_log, args=(log_queue,), name="error-log-writer", daemon=True).start()
+    return log_queue
 
 def log_error(error_details):
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, 'w') as f:
-            json.dump([], f)
-    with open(LOG_FILE, 'r+') as f:
-        try:
-            logs = json.load(f)
-        except json.JSONDecodeError:
-            logs = []
-        logs.append(error_details)
-        f.seek(0)
-        json.dump(logs, f, indent=4)
+    # Serialization happens on the caller's thread; the file is only touched by the drainer
+    get_error_log().put(orjson.dumps(error_details, default=str) + b"\n")
 
 # Initialize the database
 init_db()
@@ -73,7 +158,9 @@ st.set_page_config(
 )
 
 # -------------------- Custom Styling --------------------
-st.markdown("""
+# Streamlit drops any element a rerun does not emit, so the block is re-sent on
+# every run; whitespace is collapsed once at import to keep that payload small
+CUSTOM_CSS = " ".join("""
 <style>
     .stDeployButton {display: none;}
     #MainMenu {visibility: hidden;}
@@ -98,101 +185,247 @@ st.markdown("""
     .interview-phase { background: #2a3a4a; padding: 1rem; border-radius: 8px; margin: 1rem 0; border-left: 4px solid #ffa500; }
     .ready-for-analysis { background: #1e3a1e; padding: 1rem; border-radius: 8px; margin: 1rem 0; border-left: 4px solid #28a745; }
 </style>
-""", unsafe_allow_html=True)
+""".split())
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 # -------------------- Logic --------------------
-def start_interview(tech_stack: str, api_key: str = None, serper_key: str = None) -> dict:
+# Any of these in an interviewer reply means the interview is over
+INTERVIEW_DONE_RE = re.compile(
+    r"complete technology profile|thank you for the information|that completes our interview|"
+    r"ready to proceed with the analysis|i have enough information|ready for analysis",
+    re.IGNORECASE
+)
+
+@st.cache_resource
+def get_crew_executor():
+    # Shared by every session; long crew calls run here rather than on the script thread
+    return ThreadPoolExecutor(max_workers=CREW_MAX_WORKERS, thread_name_prefix="crew")
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_crew(api_key, serper_key):
+    # One instance per key pair. It only holds the LLM and search tool clients;
+    # kickoff() builds fresh agents, tasks and Crew per call, so sessions never
+    # share crewai objects that a run mutates.
+    # Imported here so the first page paint does not wait on crewai/LangChain.
+    from src.security_expert.crew import SecurityExpertCrew
+    return SecurityExpertCrew(api_key=api_key, serper_key=serper_key)
+
+def now_stamp() -> str:
+    # Same "YYYY-MM-DD HH:MM:SS" text as strftime, without parsing a format string per call
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+def reset_conversation():
+    # Every turn is kept verbatim for the stored transcript; only the crew input is windowed
+    st.session_state.interview_turns = []
+    # A turn still running for the old conversation must not land in the new one
+    st.session_state.pop("pending_interview", None)
+
+def add_turn(role: str, text: str):
+    st.session_state.interview_turns.append((role, text))
+
+def conversation_text(full: bool = False) -> str:
+    """Build the conversation history for a crew call from the bounded turn window
+
+    Turns older than the window are cut to excerpts unless `full` is set, which
+    gives the complete transcript for storage.
+    """
+    turns = st.session_state.interview_turns
+    recent = turns if full else turns[-CONVERSATION_MAX_TURNS:]
+    earlier = turns[:len(turns) - len(recent)]
+    parts = [f"Initial tech stack: {st.session_state.initial_tech_stack}\n\n"]
+    if earlier:
+        parts.append("Earlier in the interview (abridged):\n" + "\n".join(
+            f"{role}: {text[:TURN_EXCERPT_CHARS]}" for role, text in earlier
+        ) + "\n\n")
+    parts.extend(f"{role}: {text}\n\n" for role, text in recent)
+    return "".join(parts)
+
+def seed_quick_start(tech_stack: str):
+    # Start a fresh interview seeded with one of the example stacks
+    st.session_state.quick_input = tech_stack
+    st.session_state.interview_phase = "not_started"
+    reset_conversation()
+    st.session_state.messages = []
+
+def crew_error(e: Exception) -> dict:
+    error_info = {
+        "status": "error",
+        "error": str(e),
+        "timestamp": now_stamp(),
+    }
+    log_error(error_info)
+    return error_info
+
+def cached_kickoff(crew, cache, inputs: dict, step_callback=None, namespace: str = "") -> str:
+    """Run a crew kickoff, answering exact repeats from the persistent cache instead of the LLM"""
+    # The crew module is already loaded by get_crew(), so this import is free
+    from src.security_expert.crew import config_fingerprint
+    key = cache_key(inputs, config_fingerprint(), namespace)
+    result = cache.get(key)
+    if result is None:
+        result = str(crew.kickoff(inputs=inputs, step_callback=step_callback))
+        try:
+            cache.set(key, result)
+        except Exception as e:
+            log_error({"error": f"Failed to cache crew response: {e}", "timestamp": now_stamp()})
+    return result
+
+def start_interview(crew, cache, tech_stack: str, step_callback=None) -> dict:
     """Start the interview process with the first question"""
     try:
-        crew = SecurityExpertCrew(api_key=api_key, serper_key=serper_key)
         inputs = {
             'tech_stack_description': tech_stack,
             'conversation_history': "",
             'user_response': "",
             'action': 'start_interview'
         }
-        result = crew.kickoff(inputs=inputs)
+        result = cached_kickoff(crew, cache, inputs, step_callback)
         
         return {
             "status": "success",
             "message": str(result),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now_stamp(),
             "type": "interview_question"
         }
     except Exception as e:
-        error_info = {
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        log_error(error_info)
-        return error_info
+        return crew_error(e)
 
-def continue_interview(user_response: str, conversation_history: str, api_key: str = None, serper_key: str = None) -> dict:
+def continue_interview(crew, cache, user_response: str, conversation_history: str, step_callback=None) -> dict:
     """Continue the interview with user's response"""
     try:
-        crew = SecurityExpertCrew(api_key=api_key, serper_key=serper_key)
         inputs = {
             'tech_stack_description': "",
             'user_response': user_response,
             'conversation_history': conversation_history,
             'action': 'continue_interview'
         }
-        result = crew.kickoff(inputs=inputs)
+        result = cached_kickoff(crew, cache, inputs, step_callback)
         
         return {
             "status": "success",
             "message": str(result),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now_stamp(),
             "type": "interview_question"
         }
     except Exception as e:
-        error_info = {
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        log_error(error_info)
-        return error_info
+        return crew_error(e)
 
-def perform_analysis(conversation_history: str, api_key: str = None, serper_key: str = None) -> dict:
+def perform_analysis(crew, cache, conversation_history: str, session_id: str, step_callback=None) -> dict:
     """Perform final security analysis based on interview"""
     try:
-        crew = SecurityExpertCrew(api_key=api_key, serper_key=serper_key)
         inputs = {
             'tech_stack_description': "",
             'conversation_history': conversation_history,
             'user_response': "",
             'action': 'perform_analysis'
         }
-        result = crew.kickoff(inputs=inputs)
+        # Analyses are only reused within the session that produced them, as in the API
+        result = cached_kickoff(crew, cache, inputs, step_callback, namespace=session_id)
         
         return {
             "status": "success",
             "analysis": str(result),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now_stamp(),
             "type": "final_analysis"
         }
     except Exception as e:
-        error_info = {
-            "status": "error",
-            "error": str(e),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        }
-        log_error(error_info)
-        return error_info
+        return crew_error(e)
+
+def submit_crew_call(func, *args, api_key=None, serper_key=None):
+    # Runs a crew call on the shared executor; its intermediate agent steps land in the returned queue.
+    # The crew and kickoff cache are cache_resource calls, so they are resolved here on the script
+    # thread: executor threads have no ScriptRunContext.
+    steps = queue.Queue()
+    try:
+        crew = get_crew(api_key, serper_key)
+        cache = get_kickoff_cache()
+    except Exception as e:
+        failed = Future()
+        failed.set_result(crew_error(e))
+        return failed, steps
+    return get_crew_executor().submit(func, crew, cache, *args, step_callback=steps.put), steps
+
+def wait_with_steps(future, steps, label: str) -> dict:
+    """Show each agent step as it arrives, then return the call's result"""
+    with st.status(label) as status:
+        # kickoff() reports every step before returning, so none are left once the future is done
+        while not (future.done() and steps.empty()):
+            try:
+                step = steps.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            status.write(str(getattr(step, 'thought', None) or getattr(step, 'output', step)))
+        result = future.result()
+        status.update(state="complete" if result["status"] == "success" else "error", expanded=False)
+    return result
+
+def finish_interview_turn(future, steps, label: str):
+    """Wait for the pending interview turn and record the interviewer's reply"""
+    with st.chat_message("assistant"):
+        result = wait_with_steps(future, steps, label)
+    # Like pending_analysis, the future is only dropped once its result is in hand
+    del st.session_state.pending_interview
+
+    st.session_state.messages.append(render_message({
+        "role": "assistant",
+        "content": result.get("message", ""),
+        "analysis_data": result
+    }))
+
+    if result["status"] == "success":
+        message = result["message"]
+        add_turn("Interviewer", message)
+        if st.session_state.interview_phase == "not_started":
+            st.session_state.interview_phase = "interviewing"
+        # The profile heading is the usual marker; the plain substring test avoids the regex scan
+        elif "Complete Technology Profile" in message or INTERVIEW_DONE_RE.search(message):
+            st.session_state.interview_phase = "ready_for_analysis"
 
-def parse_report(report_text: str) -> dict:
+@lru_cache(maxsize=512)
+def history_card_html(tech_stack: str, analysis_type: str, ts: int) -> str:
+    # History rows never change, so each card is formatted once and reused on every rerun
+    formatted_ts = datetime.fromtimestamp(ts / 1000).strftime("%b %d, %H:%M")
+    return f"""
+                <div class="card" style="margin-bottom: 10px; padding: 0.8rem;">
+                    <p style="font-size: 0.9rem; font-weight: bold; margin-bottom: 5px;">{tech_stack}</p>
+                    <small><em>Type: {analysis_type.title()} | {formatted_ts}</em></small>
+                </div>
+                """
+
+# Substring checks rather than a character set: ⚠️ and 🛡️ carry a variation selector
+SECTION_EMOJIS = ('🎯', '🚨', '⚠️', '✅', '🔧', '🛡️', '📊', '🔗', '📋')
+
+def split_sections(report_text: str) -> list:
+    # Single pass over the lines; a section starts at a # or ## heading (not ###)
+    matches = []
+    title, lines = None, []
+    for line in report_text.split("\n"):
+        text = line.lstrip("#")
+        if len(line) - len(text) in (1, 2) and text[:1].isspace() and text.strip():
+            if title is not None:
+                matches.append((title, "\n".join(lines)))
+            title, lines = text, []
+        elif title is not None:
+            lines.append(line)
+    if title is not None:
+        matches.append((title, "\n".join(lines)))
+    return matches
+
+@lru_cache(maxsize=256)
+def parse_report(report_text: str) -> tuple:
+    # Streamlit re-renders every past analysis on each rerun; the cached result
+    # is an immutable tuple of (title, content) pairs so it cannot be mutated
     sections = {}
-    # Updated pattern to handle both single # and ## headings
-    pattern = r"##?\s+(.*?)\n(.*?)(?=\n##?\s+|\Z)"
-    matches = re.findall(pattern, report_text, re.DOTALL)
+    # A heading needs '#' followed by whitespace; plain replies skip the line scan
+    if "# " not in report_text and "#\t" not in report_text:
+        return (("📋 Full Report", report_text),)
+    matches = split_sections(report_text)
     if not matches:
-        return {"📋 Full Report": report_text}
+        return (("📋 Full Report", report_text),)
     for title, content in matches:
         # Clean up the title and add appropriate emoji if missing
         clean_title = title.strip()
-        if not any(emoji in clean_title for emoji in ['🎯', '🚨', '⚠️', '✅', '🔧', '🛡️', '📊', '🔗', '📋']):
+        if not any(emoji in clean_title for emoji in SECTION_EMOJIS):
             if 'executive' in clean_title.lower() or 'summary' in clean_title.lower():
                 clean_title = f"🎯 {clean_title}"
             elif 'critical' in clean_title.lower() or 'vulnerability' in clean_title.lower():
@@ -204,21 +437,53 @@ def parse_report(report_text: str) -> dict:
             else:
                 clean_title = f"📄 {clean_title}"
         sections[clean_title] = content.strip().replace("###", "####")
-    return sections
+    return tuple(sections.items())
+
+def render_message(msg: dict) -> dict:
+    # Builds the message's HTML once when it is appended; reruns only emit the stored strings
+    html, sections = "", ()
+    if msg["role"] == "user":
+        html = f'<div class="chat-message user-message"><strong>You:</strong><br>{msg["content"]}</div>'
+    elif "analysis_data" in msg:
+        data = msg["analysis_data"]
+        if data.get("status") == "success":
+            if data.get("type") == "interview_question":
+                html = f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>{data["message"]}</div>'
+            elif data.get("type") == "final_analysis":
+                html = f'<div class="chat-message analysis-result"><strong>🛡️ Security Analysis Complete:</strong><br><small>{data["timestamp"]}</small></div>'
+                sections = tuple(
+                    (title, f'<div class="card">{content}</div>')
+                    for title, content in parse_report(data["analysis"])
+                )
+        else:
+            html = f'<div class="chat-message error-result"><strong>❌ Error:</strong><br>{data["error"]}<br><small>{data.get("timestamp", "")}</small></div>'
+    else:
+        html = f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>{msg["content"]}</div>'
+    msg["html"], msg["sections"] = html, sections
+    # The raw text is no longer needed once rendered; keeping it would double each message's footprint
+    msg.pop("content", None)
+    msg.pop("analysis_data", None)
+    return msg
 
 # -------------------- State Init --------------------
 if "session_id" not in st.session_state:
-    st.session_state.session_id = os.urandom(24).hex()
+    st.session_state.session_id = uuid.uuid4().hex
 if "analysis_count" not in st.session_state:
     st.session_state.analysis_count = 0
+# Never reset (unlike analysis_count), so it can key the cached history
+if "history_version" not in st.session_state:
+    st.session_state.history_version = 0
+# Rows this session wrote, newest first, shown even before the batch writer commits them
+if "recent_history" not in st.session_state:
+    st.session_state.recent_history = []
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "quick_input" not in st.session_state:
     st.session_state.quick_input = ""
 if "interview_phase" not in st.session_state:
     st.session_state.interview_phase = "not_started"  # not_started, interviewing, ready_for_analysis, completed
-if "conversation_history" not in st.session_state:
-    st.session_state.conversation_history = ""
+if "interview_turns" not in st.session_state:
+    reset_conversation()
 if "initial_tech_stack" not in st.session_state:
     st.session_state.initial_tech_stack = ""
 
@@ -287,35 +552,47 @@ with st.sidebar:
 
     # Show analysis button if ready
     if st.session_state.interview_phase == "ready_for_analysis":
-        if st.button("🔍 Generate Security Analysis", type="primary"):
-            with st.spinner("🔬 Performing comprehensive security analysis..."):
-                analysis_result = perform_analysis(
-                    st.session_state.conversation_history,
-                    api_key or os.getenv("GEMINI_API_KEY"),
-                    serper_key or os.getenv("SERPER_API_KEY")
+        # The future outlives reruns triggered while the crew is still working, so an
+        # interrupted run resumes waiting on it instead of losing or repeating the call
+        pending = st.session_state.get("pending_analysis")
+        if st.button("🔍 Generate Security Analysis", type="primary") or pending is not None:
+            if pending is None:
+                pending = st.session_state.pending_analysis = submit_crew_call(
+                    perform_analysis,
+                    conversation_text(),
+                    st.session_state.session_id,
+                    api_key=api_key or os.getenv("GEMINI_API_KEY"),
+                    serper_key=serper_key or os.getenv("SERPER_API_KEY")
                 )
+            analysis_result = wait_with_steps(*pending, "🔬 Performing comprehensive security analysis...")
+            del st.session_state.pending_analysis
                 
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "Security Analysis Complete",
-                    "analysis_data": analysis_result
-                })
+            st.session_state.messages.append(render_message({
+                "role": "assistant",
+                "content": "Security Analysis Complete",
+                "analysis_data": analysis_result
+            }))
                 
-                if analysis_result["status"] == "success":
-                    st.session_state.interview_phase = "completed"
-                    st.session_state.analysis_count += 1
-                    add_analysis_to_db(
-                        st.session_state.session_id,
-                        st.session_state.initial_tech_stack,
-                        st.session_state.conversation_history,
-                        analysis_result["analysis"],
-                        "comprehensive"
-                    )
-                st.rerun()
+            if analysis_result["status"] == "success":
+                st.session_state.interview_phase = "completed"
+                st.session_state.analysis_count += 1
+                row = add_analysis_to_db(
+                    st.session_state.session_id,
+                    st.session_state.initial_tech_stack,
+                    conversation_text(full=True),
+                    analysis_result["analysis"],
+                    "comprehensive"
+                )
+                st.session_state.recent_history = [row] + st.session_state.recent_history[:HISTORY_LIMIT - 1]
+                st.session_state.history_version += 1
+            st.rerun()
 
     # -------------------- Analysis History --------------------
     st.markdown('<div class="section-header">📜 Analysis History</div>', unsafe_allow_html=True)
-    history = get_history_from_db(st.session_state.session_id)
+    history = merge_history(
+        st.session_state.recent_history,
+        get_cached_history(st.session_state.session_id, st.session_state.history_version)
+    )
 
     if not history:
         st.info("No analyses in the current session yet.")
@@ -326,19 +603,12 @@ with st.sidebar:
                 ts = item['timestamp']
                 analysis_type = item['analysis_type'] if 'analysis_type' in item.keys() else 'comprehensive'
                 
-                formatted_ts = ts.strftime("%b %d, %H:%M") if isinstance(ts, datetime) else ts
-
-                st.markdown(f"""
-                <div class="card" style="margin-bottom: 10px; padding: 0.8rem;">
-                    <p style="font-size: 0.9rem; font-weight: bold; margin-bottom: 5px;">{tech_stack}</p>
-                    <small><em>Type: {analysis_type.title()} | {formatted_ts}</em></small>
-                </div>
-                """, unsafe_allow_html=True)
+                st.markdown(history_card_html(tech_stack, analysis_type, ts), unsafe_allow_html=True)
                 
                 if st.button(f"Re-run Analysis", key=f"history_btn_{i}"):
                     # Reset session for new analysis
                     st.session_state.interview_phase = "not_started"
-                    st.session_state.conversation_history = ""
+                    reset_conversation()
                     st.session_state.messages = []
                     st.session_state.quick_input = tech_stack
                     st.rerun()
@@ -346,31 +616,9 @@ with st.sidebar:
     st.markdown("---")
 
     st.markdown('<div class="section-header">🚀 Quick Start Examples</div>', unsafe_allow_html=True)
-    if st.button("🌐 Web Application"): 
-        st.session_state.quick_input = "React frontend with Node.js Express backend, MongoDB database"
-        st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
-        st.session_state.messages = []
-    if st.button("📱 Mobile Application"): 
-        st.session_state.quick_input = "Flutter mobile app with Firebase backend"
-        st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
-        st.session_state.messages = []
-    if st.button("☁️ Cloud Native Stack"): 
-        st.session_state.quick_input = "Microservices with Docker and Kubernetes"
-        st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
-        st.session_state.messages = []
-    if st.button("🤖 AI/ML Application"): 
-        st.session_state.quick_input = "Python ML application with TensorFlow and PostgreSQL"
-        st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
-        st.session_state.messages = []
-    if st.button("🏢 Enterprise System"): 
-        st.session_state.quick_input = "Java Spring Boot application with Oracle database"
-        st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
-        st.session_state.messages = []
+    for label, stack in QUICK_STARTS:
+        if st.button(label):
+            seed_quick_start(stack)
     
     st.markdown("---")
     
@@ -378,7 +626,7 @@ with st.sidebar:
         st.session_state.messages = []
         st.session_state.analysis_count = 0
         st.session_state.interview_phase = "not_started"
-        st.session_state.conversation_history = ""
+        reset_conversation()
         st.session_state.initial_tech_stack = ""
         st.rerun()
     
@@ -388,118 +636,86 @@ with st.sidebar:
             st.rerun()
 
 # -------------------- Chat Display --------------------
-with st.container():
-    for msg in st.session_state.messages:
-        role = msg["role"]
-        with st.chat_message(role):
-            if role == "user":
-                st.markdown(f'<div class="chat-message user-message"><strong>You:</strong><br>{msg["content"]}</div>', unsafe_allow_html=True)
-            elif role == "assistant":
-                if "analysis_data" in msg:
-                    data = msg["analysis_data"]
-                    if data.get("status") == "success":
-                        if data.get("type") == "interview_question":
-                            st.markdown(f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>{data["message"]}</div>', unsafe_allow_html=True)
-                        elif data.get("type") == "final_analysis":
-                            st.markdown(f'<div class="chat-message analysis-result"><strong>🛡️ Security Analysis Complete:</strong><br><small>{data["timestamp"]}</small></div>', unsafe_allow_html=True)
-                            parsed_analysis = parse_report(data["analysis"])
-                            if parsed_analysis:
-                                # Default the first section to be open
-                                first_title = next(iter(parsed_analysis))
-                                for title, content in parsed_analysis.items():
-                                    with st.expander(title, expanded=(title == first_title)):
-                                        st.markdown(f'<div class="card">{content}</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<div class="chat-message error-result"><strong>❌ Error:</strong><br>{data["error"]}<br><small>{data.get("timestamp", "")}</small></div>', unsafe_allow_html=True)
-                else:
-                    st.markdown(f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>{msg["content"]}</div>', unsafe_allow_html=True)
-
-# -------------------- Input Processing --------------------
-# Handle quick input
-if st.session_state.quick_input:
-    prompt = st.session_state.quick_input
-    st.session_state.quick_input = ""
-else:
-    # Dynamic prompt based on phase
-    if st.session_state.interview_phase == "not_started":
-        prompt = st.chat_input("💬 Describe your technology stack to begin the security interview...")
-    elif st.session_state.interview_phase == "interviewing":
-        prompt = st.chat_input("💬 Answer the security expert's question...")
-    elif st.session_state.interview_phase == "completed":
-        prompt = st.chat_input("💬 Ask follow-up questions about your security analysis...")
+@st.fragment
+def chat_area():
+    # Chat input only reruns this fragment; a processed prompt ends in a full app
+    # rerun so the sidebar stats, phase and history pick up the new state
+    with st.container():
+        for msg in st.session_state.messages:
+            if "html" not in msg:
+                render_message(msg)
+            with st.chat_message(msg["role"]):
+                if msg["html"]:
+                    st.markdown(msg["html"], unsafe_allow_html=True)
+                if msg["sections"]:
+                    # Default the first section to be open
+                    first_title = msg["sections"][0][0]
+                    for title, card in msg["sections"]:
+                        with st.expander(title, expanded=(title == first_title)):
+                            st.markdown(card, unsafe_allow_html=True)
+
+    # A turn interrupted by a rerun is still running on the executor; wait for it
+    # again instead of dropping the answer
+    if "pending_interview" in st.session_state:
+        finish_interview_turn(*st.session_state.pending_interview)
+        st.rerun(scope="app")
+
+    # -------------------- Input Processing --------------------
+    # Handle quick input
+    if st.session_state.quick_input:
+        prompt = st.session_state.quick_input
+        st.session_state.quick_input = ""
     else:
-        prompt = st.chat_input("💬 Type your message...")
+        # Dynamic prompt based on phase
+        if st.session_state.interview_phase == "not_started":
+            prompt = st.chat_input("💬 Describe your technology stack to begin the security interview...")
+        elif st.session_state.interview_phase == "interviewing":
+            prompt = st.chat_input("💬 Answer the security expert's question...")
+        elif st.session_state.interview_phase == "completed":
+            prompt = st.chat_input("💬 Ask follow-up questions about your security analysis...")
+        else:
+            prompt = st.chat_input("💬 Type your message...")
 
-if prompt:
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    if prompt:
+        # Add user message
+        user_message = render_message({"role": "user", "content": prompt})
+        st.session_state.messages.append(user_message)
 
-    with st.chat_message("user"):
-        st.markdown(f'<div class="chat-message user-message"><strong>You:</strong><br>{prompt}</div>', unsafe_allow_html=True)
+        with st.chat_message("user"):
+            st.markdown(user_message["html"], unsafe_allow_html=True)
 
-    with st.chat_message("assistant"):
         if st.session_state.interview_phase == "not_started":
             # Start the interview
             st.session_state.initial_tech_stack = prompt
-            st.session_state.conversation_history += f"Initial tech stack: {prompt}\n\n"
-            
-            with st.spinner("🤖 Security expert is preparing interview questions..."):
-                result = start_interview(
-                    prompt,
-                    api_key or os.getenv("GEMINI_API_KEY"),
-                    serper_key or os.getenv("SERPER_API_KEY")
-                )
-                
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": result.get("message", ""),
-                    "analysis_data": result
-                })
-                
-                if result["status"] == "success":
-                    st.session_state.interview_phase = "interviewing"
-                    st.session_state.conversation_history += f"Interviewer: {result['message']}\n\n"
-                
+            st.session_state.pending_interview = (*submit_crew_call(
+                start_interview,
+                prompt,
+                api_key=api_key or os.getenv("GEMINI_API_KEY"),
+                serper_key=serper_key or os.getenv("SERPER_API_KEY")
+            ), "🤖 Security expert is preparing interview questions...")
+
         elif st.session_state.interview_phase == "interviewing":
             # Continue the interview
-            st.session_state.conversation_history += f"User: {prompt}\n\n"
-            
-            with st.spinner("🤖 Processing your response..."):
-                result = continue_interview(
-                    prompt,
-                    st.session_state.conversation_history,
-                    api_key or os.getenv("GEMINI_API_KEY"),
-                    serper_key or os.getenv("SERPER_API_KEY")
-                )
-                
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": result.get("message", ""),
-                    "analysis_data": result
-                })
-                
-                if result["status"] == "success":
-                    message = result["message"]
-                    st.session_state.conversation_history += f"Interviewer: {message}\n\n"
-                    
-                    if "Complete Technology Profile" in message or "📋 Complete Technology Profile" in message:
-                        st.session_state.interview_phase = "ready_for_analysis"
-
-                    if any(phrase in message.lower() for phrase in [
-                        "thank you for the information",
-                        "that completes our interview",
-                        "ready to proceed with the analysis",
-                        "i have enough information",
-                        "ready for analysis"
-                    ]):
-                        st.session_state.interview_phase = "ready_for_analysis"
-        
+            add_turn("User", prompt)
+            st.session_state.pending_interview = (*submit_crew_call(
+                continue_interview,
+                prompt,
+                conversation_text(),
+                api_key=api_key or os.getenv("GEMINI_API_KEY"),
+                serper_key=serper_key or os.getenv("SERPER_API_KEY")
+            ), "🤖 Processing your response...")
+
         elif st.session_state.interview_phase == "completed":
-            st.markdown(f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>Thank you for your question: "{prompt}". For detailed follow-up analysis, please start a new session or refer to the comprehensive analysis above.</div>', unsafe_allow_html=True)
-            
-            st.session_state.messages.append({
+            with st.chat_message("assistant"):
+                st.markdown(f'<div class="chat-message interviewer-message"><strong>🤖 Security Expert:</strong><br>Thank you for your question: "{prompt}". For detailed follow-up analysis, please start a new session or refer to the comprehensive analysis above.</div>', unsafe_allow_html=True)
+
+            st.session_state.messages.append(render_message({
                 "role": "assistant", 
                 "content": f"Thank you for your question: '{prompt}'. For detailed follow-up analysis, please start a new session or refer to the comprehensive analysis above."
-            })
-    st.rerun()
+            }))
+
+        if "pending_interview" in st.session_state:
+            finish_interview_turn(*st.session_state.pending_interview)
+        st.rerun(scope="app")
 
+chat_area()
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.security_expert.database import ConnectionPool, compress_text, decompress_text
+
+
+# Exact-match only. Near-duplicate (embedding or normalized-text) matching was
+# dropped: prompts that differ only slightly, such as "C++" and "C#", need
+# different answers, and no local embedding model is available to this service.
+def cache_key(inputs: Dict[str, Any], version: str = "", namespace: str = "") -> str:
+    """Stable digest of the exact kickoff inputs plus a prompt/config version
+
+    A non-empty `namespace` (e.g. a session id) keeps its entries apart from
+    every other namespace's.
+    """
+    payload = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=20)
+    digest.update(version.encode("utf-8"))
+    if namespace:
+        digest.update(b"\0" + namespace.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of crew responses with a TTL
+
+    Keyed by the exact cache_key() digest of a kickoff, so only identical
+    inputs in the same namespace share an LLM response.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, if present and fresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        """Store a response, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class PersistentResponseCache:
+    """SQLite-backed exact-match cache shared by every worker process using the same database
+
+    Meant for the summaries pool: responses are stored zlib-compressed, and their
+    writes stay off the history database's write lock.
+    """
+
+    def __init__(self, pool: ConnectionPool, ttl: float = 86400):
+        self.pool = pool
+        self.ttl = ttl
+        with self.pool.connection(write=True) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS kickoff_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    response BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+
+    def get(self, key: str) -> Optional[str]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT response FROM kickoff_cache WHERE cache_key = ? AND created_at > ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        return decompress_text(row[0]) if row else None
+
+    def set(self, key: str, value: str):
+        with self.pool.connection(write=True) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kickoff_cache (cache_key, response, created_at) VALUES (?, ?, ?)",
+                (key, compress_text(value), time.time())
+            )
+
+    def purge_expired(self) -> int:
+        """Delete expired rows, returning how many were removed"""
+        with self.pool.connection(write=True) as conn:
+            return conn.execute(
+                "DELETE FROM kickoff_cache WHERE created_at <= ?", (time.time() - self.ttl,)
+            ).rowcount
@@ -1,4 +1,7 @@
 import os
+import hashlib
+from functools import cached_property, lru_cache
+from pathlib import Path
 from crewai import Agent, Task, Crew, Process
 from crewai.project import CrewBase, agent, crew, task
 from crewai_tools import SerperDevTool
@@ -9,6 +12,22 @@ from langchain_litellm import ChatLiteLLM
 
 load_dotenv()
 
+CONFIG_DIR = Path(__file__).parent / 'config'
+
+
+@lru_cache(maxsize=1)
+def config_fingerprint() -> str:
+    """Hash of the agent/task prompt templates, used to invalidate cached responses"""
+    digest = hashlib.blake2b(digest_size=8)
+    for name in ('agents.yaml', 'tasks.yaml'):
+        digest.update((CONFIG_DIR / name).read_bytes())
+    return digest.hexdigest()
+
+@lru_cache(maxsize=1)
+def shared_long_term_memory() -> LongTermMemory:
+    """One LongTermMemory (and its SQLite storage handle) per process, shared by every crew"""
+    return LongTermMemory()
+
 @CrewBase
 class SecurityExpertCrew:
     """
@@ -20,41 +39,57 @@ class SecurityExpertCrew:
 
     def __init__(self, api_key: str = None, serper_key: str = None):
         gemini_key = api_key or os.getenv("GEMINI_API_KEY")
-        serper_api_key = serper_key or os.getenv("SERPER_API_KEY")
+        self.serper_api_key = serper_key or os.getenv("SERPER_API_KEY")
         if not gemini_key:
             raise ValueError("No Gemini API Key found")
 
-        self.llm = ChatGoogleGenerativeAI(
+    # The LLM client and search tool are built on first use rather than in __init__
+    @cached_property
+    def llm(self):
+        return ChatGoogleGenerativeAI(
             model="gemini-1.5-flash",  # or gemini-1.5-pro
             temperature=0.7,
             google_api_key=os.getenv("GOOGLE_API_KEY")
         )
 
+    @cached_property
+    def search_tool(self):
+        if not self.serper_api_key:
+            return None
+        try:
+            return SerperDevTool()
+        except Exception:
+            return None
 
-        self.search_tool = None
-        if serper_api_key:
-            try:
-                self.search_tool = SerperDevTool()
-            except Exception:
-                self.search_tool = None
-        self.memory = LongTermMemory()
-
-    @agent
-    def security_interviewer(self) -> Agent:
+    # crewai memoizes @agent/@task results per instance, and Crew.kickoff rewrites
+    # the task description with its inputs and rebinds the agent in place. So
+    # kickoff() builds fresh Agent/Task objects from these factories each call;
+    # only the LLM client and search tool above are shared between calls.
+    def _new_interviewer(self, step_callback=None) -> Agent:
         return Agent(
             config=self.agents_config['security_interviewer'],
             llm=self.llm,
-            verbose=True
+            verbose=True,
+            step_callback=step_callback
         )
 
-    @agent
-    def security_analyst(self) -> Agent:
+    def _new_analyst(self, step_callback=None) -> Agent:
         return Agent(
             config=self.agents_config['security_analyst'],
             llm=self.llm,
             verbose=True,
-            memory=self.memory
+            step_callback=step_callback,
+            # Only the analyst uses memory, so interview-only crews never open the store
+            memory=shared_long_term_memory()
         )
+
+    @agent
+    def security_interviewer(self) -> Agent:
+        return self._new_interviewer()
+
+    @agent
+    def security_analyst(self) -> Agent:
+        return self._new_analyst()
     
     @task
     def interview_task(self) -> Task:
@@ -72,24 +107,30 @@ class SecurityExpertCrew:
 
     @crew
     def crew(self) -> Crew:
-        action = getattr(self, '_current_action', 'start_interview')
+        return self._build_crew(getattr(self, '_current_action', 'start_interview'))
 
+    def _build_crew(self, action: str, step_callback=None) -> Crew:
+        # Crew only copies its step_callback onto agents that have none, so the
+        # callback is set on this call's agent directly
         if action == 'perform_analysis':
-            return Crew(
-                agents=[self.security_analyst()],
-                tasks=[self.analysis_task()],
-                process=Process.sequential,
-                verbose=True
-            )
+            worker = self._new_analyst(step_callback)
+            task_config = self.tasks_config['analysis_task']
         else:
-            return Crew(
-                agents=[self.security_interviewer()],
-                tasks=[self.interview_task()],
-                process=Process.sequential,
-                verbose=True
-            )
-
-    def kickoff(self, inputs):
-        self._current_action = inputs.get('action', 'start_interview')
-        crew_run = self.crew()
+            worker = self._new_interviewer(step_callback)
+            task_config = self.tasks_config['interview_task']
+        return Crew(
+            agents=[worker],
+            tasks=[Task(config=task_config, agent=worker)],
+            process=Process.sequential,
+            verbose=True,
+            step_callback=step_callback
+        )
+
+    def kickoff(self, inputs, step_callback=None):
+        # The action is passed through rather than stored on the instance, and the
+        # crew is built from fresh agents and tasks, so concurrent calls on one cached
+        # SecurityExpertCrew share no mutable crewai objects.
+        # step_callback is invoked with each intermediate agent step.
+        action = inputs.get('action', 'start_interview')
+        crew_run = self._build_crew(action, step_callback)
         return crew_run.kickoff(inputs=inputs)
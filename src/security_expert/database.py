@@ -0,0 +1,436 @@
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-connection tuning. journal_mode=WAL is persisted in the database file,
+# the remaining PRAGMAs silently revert to defaults on every new connection.
+# busy_timeout is not listed: connect()'s `timeout` argument already sets it.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the WAL and performance PRAGMAs to a connection"""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect(db_file: str, timeout: float = 30, **kwargs) -> sqlite3.Connection:
+    """Open a tuned SQLite connection in autocommit mode
+
+    The sqlite3 module's implicit transactions open a DEFERRED transaction before
+    DML and upgrade the lock on first write, which can fail with SQLITE_BUSY under
+    contention. Connections run in autocommit instead and writers use transaction().
+    Queries are module-level constants, so a larger per-connection statement cache
+    lets long-lived pooled connections skip re-preparing them.
+    """
+    kwargs.setdefault('isolation_level', None)
+    kwargs.setdefault('cached_statements', 256)
+    return configure_connection(sqlite3.connect(db_file, timeout=timeout, **kwargs))
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run a block inside BEGIN IMMEDIATE, committing on success and rolling back on error"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    try:
+        conn.execute("COMMIT")
+    except BaseException:
+        # A failed COMMIT (deferred constraint, disk full, I/O error) can leave the
+        # transaction open; roll back so a pooled connection is reusable
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+@contextmanager
+def get_conn(db_file: str, write: bool = False, timeout: float = 30, **kwargs) -> Iterator[sqlite3.Connection]:
+    """Yield a tuned connection, wrapped in a write transaction when `write` is set, and always close it"""
+    conn = connect(db_file, timeout=timeout, **kwargs)
+    try:
+        if write:
+            with transaction(conn):
+                yield conn
+        else:
+            yield conn
+    finally:
+        conn.close()
+
+
+TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS analysis_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        tech_stack TEXT NOT NULL,
+        interview_results TEXT,
+        analysis_summary TEXT NOT NULL,
+        analysis_type TEXT DEFAULT 'comprehensive',
+        status TEXT DEFAULT 'completed',
+        timestamp INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        summary_id TEXT,
+        interview_hash TEXT
+    )
+'''
+
+INDEX_DDL = (
+    # idx_session_ts_id has session_id as its leading key, so the old single-column index is redundant
+    "DROP INDEX IF EXISTS idx_session_id",
+    "CREATE INDEX IF NOT EXISTS idx_timestamp ON analysis_history(timestamp)",
+    # Serves WHERE session_id = ? ORDER BY timestamp DESC, id DESC (including the
+    # (timestamp, id) keyset used for paging) as a range scan with no sort step
+    "DROP INDEX IF EXISTS idx_session_ts",
+    "CREATE INDEX IF NOT EXISTS idx_session_ts_id ON analysis_history(session_id, timestamp DESC, id DESC)",
+)
+
+# Columns added after the table was first shipped by the Streamlit app. ALTER TABLE
+# cannot use a non-constant default, so older rows get NULL timestamps.
+_ADDED_COLUMNS = {
+    'status': "TEXT DEFAULT 'completed'",
+    'created_at': 'DATETIME',
+    'updated_at': 'DATETIME',
+    'summary_id': 'TEXT',
+    'interview_hash': 'TEXT',
+}
+
+
+# One row per session, upserted in the same transaction as each history insert,
+# so listing recent sessions never has to aggregate analysis_history
+SESSIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        last_activity INTEGER NOT NULL,
+        analysis_count INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+SESSIONS_INDEX_DDL = "CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity DESC)"
+
+UPSERT_SESSION_SQL = '''
+    INSERT INTO sessions (session_id, last_activity, analysis_count) VALUES (?, ?, 1)
+    ON CONFLICT(session_id) DO UPDATE SET
+        last_activity = MAX(last_activity, excluded.last_activity),
+        analysis_count = analysis_count + 1
+'''
+
+# Bumped via PRAGMA user_version once data migrations below have run
+SCHEMA_VERSION = 3
+
+
+def now_ms() -> int:
+    """Current time in epoch milliseconds, the storage format of analysis_history.timestamp"""
+    return time.time_ns() // 1_000_000
+
+
+def init_schema(conn: sqlite3.Connection):
+    """Create or upgrade the analysis_history schema shared by the API and the Streamlit app"""
+    conn.execute(TABLE_DDL)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(analysis_history)")}
+    for column, definition in _ADDED_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE analysis_history ADD COLUMN {column} {definition}")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < 1:
+        # Timestamps used to be stored as local-time datetime.now() text; 'utc' converts them from local time
+        conn.execute('''
+            UPDATE analysis_history
+            SET timestamp = CAST((julianday(timestamp, 'utc') - 2440587.5) * 86400000 AS INTEGER)
+            WHERE typeof(timestamp) = 'text' AND julianday(timestamp, 'utc') IS NOT NULL
+        ''')
+        # Unparseable text would become NULL and fail NOT NULL: fall back to created_at
+        # (CURRENT_TIMESTAMP, already UTC), or the epoch when that is missing too
+        fallback = conn.execute('''
+            UPDATE analysis_history
+            SET timestamp = CAST((COALESCE(julianday(created_at), 2440587.5) - 2440587.5) * 86400000 AS INTEGER)
+            WHERE typeof(timestamp) = 'text'
+        ''').rowcount
+        if fallback:
+            logger.warning("Migrated %d history rows with unparseable timestamps from created_at", fallback)
+    conn.execute(SESSIONS_DDL)
+    conn.execute(SESSIONS_INDEX_DDL)
+    if version < 2:
+        conn.execute('''
+            INSERT OR REPLACE INTO sessions (session_id, last_activity, analysis_count)
+            SELECT session_id, MAX(timestamp), COUNT(*) FROM analysis_history GROUP BY session_id
+        ''')
+    if version < 3:
+        # The kickoff cache moved to the summaries database; entries here are only a cache
+        conn.execute("DROP TABLE IF EXISTS kickoff_cache")
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    for ddl in INDEX_DDL:
+        conn.execute(ddl)
+
+
+# Full analysis text lives in a separate database file so the large writes do not
+# serialize on the same WAL as the small, frequent history reads. analysis_history
+# keeps a summary_id pointing at its row here.
+SUMMARIES_DDL = '''
+    CREATE TABLE IF NOT EXISTS analysis_summaries (
+        summary_id TEXT PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        summary BLOB NOT NULL
+    )
+'''
+
+INSERT_SUMMARY_SQL = "INSERT INTO analysis_summaries (summary_id, session_id, summary) VALUES (?, ?, ?)"
+
+
+# Interview transcripts are stored once per distinct body and referenced from
+# analysis_history.interview_hash, instead of repeating tens of KB per history row.
+CONVERSATIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS conversation_blobs (
+        hash TEXT PRIMARY KEY,
+        body BLOB NOT NULL
+    )
+'''
+
+INSERT_CONVERSATION_SQL = "INSERT OR IGNORE INTO conversation_blobs (hash, body) VALUES (?, ?)"
+
+
+def init_summaries_schema(conn: sqlite3.Connection):
+    """Create the blob tables that live in the summaries database"""
+    conn.execute(SUMMARIES_DDL)
+    conn.execute(CONVERSATIONS_DDL)
+
+
+# LLM output compresses 3-5x. Blobs are stored as zlib BLOBs; TEXT values written
+# before compression was enabled are passed through unchanged on read.
+COMPRESSION_LEVEL = 6
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_text(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+# analysis_history.analysis_summary keeps only this many leading characters as a
+# preview; the full text is in analysis_summaries
+SUMMARY_PREVIEW_CHARS = 500
+
+
+def summary_preview(summary: str) -> str:
+    return summary[:SUMMARY_PREVIEW_CHARS]
+
+
+def new_summary_id() -> str:
+    return uuid.uuid4().hex
+
+
+def conversation_hash(body: str) -> str:
+    # BLAKE2b at sha256's width: same 64-char key, faster in CPython
+    return hashlib.blake2b(body.encode('utf-8'), digest_size=32).hexdigest()
+
+
+def fetch_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    """Fetch all rows as dicts, zipping plain tuples with the column names read once"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def attach_summaries(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill analysis_summary from the summaries database, in place
+
+    Rows written before the split keep their inline analysis_summary. The
+    summary_id key is removed; summary_truncated marks rows whose full text is
+    missing, so analysis_summary is only the stored preview.
+    """
+    ids = [row['summary_id'] for row in rows if row.get('summary_id')]
+    summaries = {}
+    if ids:
+        placeholders = ','.join('?' * len(ids))
+        summaries = dict(conn.execute(
+            f"SELECT summary_id, summary FROM analysis_summaries WHERE summary_id IN ({placeholders})", ids
+        ))
+    for row in rows:
+        summary_id = row.pop('summary_id', None)
+        if summary_id in summaries:
+            row['analysis_summary'] = decompress_text(summaries[summary_id])
+        row['summary_truncated'] = summary_id is not None and summary_id not in summaries
+    return rows
+
+
+def attach_conversations(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill interview_results from conversation_blobs, in place, removing interview_hash
+
+    interview_missing marks rows whose transcript blob is missing.
+    """
+    hashes = list({row['interview_hash'] for row in rows if row.get('interview_hash')})
+    bodies = {}
+    if hashes:
+        placeholders = ','.join('?' * len(hashes))
+        bodies = dict(conn.execute(
+            f"SELECT hash, body FROM conversation_blobs WHERE hash IN ({placeholders})", hashes
+        ))
+    for row in rows:
+        interview_hash = row.pop('interview_hash', None)
+        if interview_hash in bodies:
+            row['interview_results'] = decompress_text(bodies[interview_hash])
+        row['interview_missing'] = interview_hash is not None and interview_hash not in bodies
+    return rows
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, tuned SQLite connections"""
+
+    def __init__(self, db_file: str, size: int = 5, timeout: float = 30):
+        self.db_file = db_file
+        self.timeout = timeout
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=size)
+        # WAL allows concurrent readers but only one writer at a time
+        self._write_lock = threading.Lock()
+        for _ in range(size):
+            self._pool.put(connect(db_file, timeout=timeout, check_same_thread=False))
+
+    @contextmanager
+    def connection(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, in a write transaction when `write` is set, and return it to the pool"""
+        try:
+            conn = self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SQLite connection available after {self.timeout}s")
+        try:
+            if write:
+                with self._write_lock, transaction(conn):
+                    yield conn
+            else:
+                yield conn
+        finally:
+            conn.row_factory = None
+            self._pool.put(conn)
+
+    def close(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# Errors caused by the rows themselves rather than by lock contention or I/O
+_ROW_ERRORS = (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.ProgrammingError, sqlite3.InterfaceError)
+
+
+class BatchWriter:
+    """Single writer thread that coalesces queued rows into one transaction
+
+    Rows passed to put() are drained in batches of up to `max_batch`, waiting at
+    most `max_delay` seconds for a batch to fill, and written with executemany
+    so N queued rows cost one commit instead of N. A row may name its own
+    statement; rows for different statements still share the batch transaction.
+    A row's `on_commit` callback runs on the writer thread once it has committed,
+    and never if the row is dropped.
+    """
+
+    _STOP = object()
+
+    def __init__(self, pool: ConnectionPool, sql: str, max_batch: int = 64,
+                 max_delay: float = 0.05, retries: int = 3):
+        self.pool = pool
+        self.sql = sql
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-batch-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row: tuple, sql: Optional[str] = None, on_commit: Optional[Callable[[], None]] = None):
+        """Queue a row for the next batch, using the writer's statement unless `sql` is given"""
+        self._queue.put((sql or self.sql, row, on_commit))
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write pending rows and stop the writer thread"""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _drain(self) -> tuple:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while batch[-1] is not self._STOP and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        stop = batch[-1] is self._STOP
+        return (batch[:-1] if stop else batch), stop
+
+    def _committed(self, items: list):
+        for _, _, on_commit in items:
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception:
+                    logger.exception("Batch on_commit callback failed")
+
+    def _write(self, items: list):
+        statements: Dict[str, list] = {}
+        for sql, row, _ in items:
+            statements.setdefault(sql, []).append(row)
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self.pool.connection(write=True) as conn:
+                    for sql, rows in statements.items():
+                        conn.executemany(sql, rows)
+                self._committed(items)
+                return
+            except _ROW_ERRORS as e:
+                # Retrying cannot fix a bad row; isolate it so the rest of the batch still commits
+                if len(items) == 1:
+                    logger.error("Dropping row that cannot be written: %s", e)
+                    return
+                logger.warning("Batch write of %d rows failed, writing them one by one: %s", len(items), e)
+                for item in items:
+                    self._write([item])
+                return
+            except Exception as e:
+                logger.warning("Batch write of %d rows failed (attempt %d/%d): %s", len(items), attempt, self.retries, e)
+                if attempt < self.retries:
+                    time.sleep(min(2 ** attempt, 10))
+        logger.error("Dropping batch of %d rows after %d failed attempts", len(items), self.retries)
+
+    def _run(self):
+        while True:
+            rows, stop = self._drain()
+            try:
+                if rows:
+                    self._write(rows)
+            finally:
+                for _ in range(len(rows) + stop):
+                    self._queue.task_done()
+            if stop:
+                return